@@ -6,4 +6,11 @@ from .openrouter import OpenRouterService
 
 InvoiceData = InvoiceExtract
 
-__all__ = ["main", "Config", "InvoiceData", "State", "OpenRouterService"]
+__all__ = [
+    "main",
+    "Config",
+    "InvoiceData",
+    "InvoiceExtract",
+    "State",
+    "OpenRouterService",
+]
@@ -9,6 +9,7 @@ from datetime import datetime
 from pathlib import Path
 
 import click
+import orjson
 import requests
 from google.oauth2.credentials import Credentials
 from googleapiclient.errors import HttpError
@@ -18,8 +19,9 @@ from .cli import setup_wizard
 from .config import Config, InvoiceExtract, State
 from .drive import GoogleDriveService
 from .oauth import OAuth2Manager
-from .openrouter import OpenRouterService, build_invoice_prompt
+from .openrouter import INVOICE_PROMPT, OpenRouterService
 from .sheets import GoogleSheetsService
+from .utils import pdf_digest
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +29,26 @@ logger = logging.getLogger(__name__)
 class InvoiceProcessor:
     """Main processor that orchestrates the invoice scanning workflow."""
 
-    def __init__(self, config: Config, credentials: Credentials):
+    DOWNLOAD_WORKERS = 4
+
+    def __init__(
+        self, config: Config, credentials: Credentials, model_name: str | None = None
+    ):
         self.config = config
         self.credentials = credentials
         self.drive_service = GoogleDriveService(credentials)
-        self.sheets_service = GoogleSheetsService(credentials, config.spreadsheet_id)
-        self.openrouter_service = OpenRouterService(config.openrouter_api_key)
+        self.sheets_service = GoogleSheetsService(
+            credentials,
+            config.spreadsheet_id,
+            headers_installed=config.state.headers_installed.get(
+                config.spreadsheet_id, ()
+            ),
+        )
+        self.openrouter_service = OpenRouterService(
+            config.openrouter_api_key,
+            model=model_name,
+            cache_dir=config.extraction_cache_dir,
+        )
 
     def _process_file(self, file_info: dict) -> InvoiceExtract | None:
         """Process a single file and return InvoiceExtract."""
@@ -40,28 +56,27 @@ class InvoiceProcessor:
         if not pdf_content:
             return None
 
-        extracted = self._extract_invoice(pdf_content, file_info)
-        if not extracted:
-            return None
-
-        return extracted.model_copy(
-            update={
-                "file_id": file_info["id"],
-                "file_name": file_info["name"],
-                "file_url": file_info.get("webViewLink", ""),
-                "extraction_date": datetime.now().isoformat(),
-            }
-        )
+        return self._process_content(file_info, pdf_content)
 
     def _process_content(
-        self, file_info: dict, pdf_content: bytes
+        self, file_info: dict, pdf_content: bytes, digest: str | None = None
     ) -> InvoiceExtract | None:
-        """Process a pre-downloaded PDF and return InvoiceExtract."""
-        extracted = self._extract_invoice(pdf_content, file_info)
+        """Process a pre-downloaded PDF and return InvoiceExtract.
+
+        A ``digest`` means the caller already hashed the PDF and checked the
+        extraction cache, so neither is repeated.
+        """
+        extracted = self._extract_invoice(pdf_content, file_info, digest)
         if not extracted:
             return None
 
-        return extracted.model_copy(
+        return self._attach_file_info(extracted, file_info)
+
+    def _attach_file_info(
+        self, invoice: InvoiceExtract, file_info: dict
+    ) -> InvoiceExtract:
+        """Copy an extracted invoice and stamp it with Drive file metadata."""
+        return invoice.model_copy(
             update={
                 "file_id": file_info["id"],
                 "file_name": file_info["name"],
@@ -82,26 +97,20 @@ class InvoiceProcessor:
             return None
 
     def _extract_invoice(
-        self, pdf_content: bytes, file_info: dict
+        self, pdf_content: bytes, file_info: dict, digest: str | None = None
     ) -> InvoiceExtract | None:
         """Extract invoice data from a PDF."""
         try:
             return self.openrouter_service.extract_invoice_data(
-                pdf_content, file_info["name"]
+                pdf_content,
+                file_info["name"],
+                digest=digest,
+                lookup_cache=digest is None,
             )
         except (ValueError, ValidationError) as e:
             logger.exception(f"Failed to extract {file_info['name']}: {e}")
             return None
 
-    def _append_invoice(self, invoice: InvoiceExtract, file_name: str) -> bool:
-        """Append invoice to sheets and report success."""
-        try:
-            self.sheets_service.append_invoice(invoice, invoice.invoice_date)
-            return True
-        except HttpError as e:
-            logger.exception(f"Failed to append invoice {file_name}: {e}")
-            return False
-
     def _parse_total_value(self, invoice: InvoiceExtract) -> float | None:
         """Parse total value for summary reporting."""
         try:
@@ -109,6 +118,66 @@ class InvoiceProcessor:
         except (TypeError, ValueError):
             return None
 
+    def _extract_files(self, files: list[dict]) -> list[InvoiceExtract]:
+        """Download files and extract them concurrently as each download lands."""
+        submitted: dict[str, dict] = {}
+        duplicates: dict[str, list[dict]] = {}
+        extracted: dict[str, InvoiceExtract] = {}
+        with (
+            PoolExecutor(max_workers=self.DOWNLOAD_WORKERS) as downloader,
+            PoolExecutor(max_workers=self.config.extraction_workers) as executor,
+        ):
+            futures = {}
+            downloads = {
+                downloader.submit(self._download_pdf, file_info): file_info
+                for file_info in files
+            }
+            for download in as_completed(downloads):
+                file_info = downloads[download]
+                pdf_content = download.result()
+                if not pdf_content:
+                    continue
+                digest = pdf_digest(pdf_content)
+                if digest in submitted:
+                    logger.info(
+                        f"{file_info['name']} is identical to "
+                        f"{submitted[digest]['name']}; reusing its extraction"
+                    )
+                    duplicates.setdefault(digest, []).append(file_info)
+                    continue
+                submitted[digest] = file_info
+                # Cache hits are resolved here so they never wait for a worker.
+                cached = self.openrouter_service.cached_invoice(
+                    digest, file_info["name"]
+                )
+                if cached is not None:
+                    extracted[digest] = self._attach_file_info(cached, file_info)
+                    continue
+                future = executor.submit(
+                    self._process_content, file_info, pdf_content, digest
+                )
+                futures[future] = digest
+
+            for future in as_completed(futures):
+                digest = futures[future]
+                file_info = submitted[digest]
+                try:
+                    invoice = future.result()
+                except Exception as e:
+                    logger.exception(f"Failed to process {file_info['name']}: {e}")
+                    continue
+                if invoice:
+                    extracted[digest] = invoice
+
+        extracted_invoices: list[InvoiceExtract] = []
+        for digest, invoice in extracted.items():
+            extracted_invoices.append(invoice)
+            extracted_invoices.extend(
+                self._attach_file_info(invoice, duplicate)
+                for duplicate in duplicates.get(digest, [])
+            )
+        return extracted_invoices
+
     def run(self) -> None:
         """Execute the main processing workflow."""
         logger.info("Starting invoice processing...")
@@ -125,37 +194,12 @@ class InvoiceProcessor:
         processed_count = 0
         total_value = 0.0
 
-        downloaded: list[tuple[dict, bytes]] = []
-        for file_info in new_files:
-            pdf_content = self._download_pdf(file_info)
-            if not pdf_content:
-                continue
-            downloaded.append((file_info, pdf_content))
-
-        extracted_invoices: list[InvoiceExtract] = []
-        with PoolExecutor(max_workers=5) as executor:
-            futures = {
-                executor.submit(
-                    self._process_content, file_info, pdf_content
-                ): file_info
-                for file_info, pdf_content in downloaded
-            }
-
-            for future in as_completed(futures):
-                file_info = futures[future]
-                try:
-                    invoice = future.result()
-                except Exception as e:
-                    logger.exception(f"Failed to process {file_info['name']}: {e}")
-                    continue
-                if not invoice:
-                    continue
-                extracted_invoices.append(invoice)
+        extracted_invoices = self._extract_files(new_files)
 
         if extracted_invoices:
             try:
                 appended_ids = self.sheets_service.append_invoices_batch(
-                    extracted_invoices
+                    extracted_invoices, known_ids=processed_ids
                 )
             except HttpError as e:
                 logger.exception(f"Failed to append invoice batch: {e}")
@@ -171,6 +215,9 @@ class InvoiceProcessor:
         state = self.config.state
         state.last_run = datetime.now().isoformat()
         state.processed_count += processed_count
+        state.headers_installed[self.config.spreadsheet_id] = sorted(
+            self.sheets_service.headers_installed
+        )
         state.save()
 
         logger.info("Invoice processing complete!")
@@ -247,9 +294,7 @@ def _run_scan(config: Config, state: State, model_name: str | None = None) -> No
     if not credentials:
         return
 
-    processor = InvoiceProcessor(config, credentials)
-    if model_name:
-        processor.openrouter_service.model = model_name
+    processor = InvoiceProcessor(config, credentials, model_name)
     processor.run()
 
 
@@ -375,6 +420,11 @@ def scan_command(ctx: click.Context) -> None:
     is_flag=True,
     help="Print results in a pivot table with models as columns.",
 )
+@click.option(
+    "--rules",
+    is_flag=True,
+    help="Skip the model when labelled fields in the PDF text cover the whole invoice.",
+)
 def local_command(
     pdf_path: Path,
     model_names: tuple[str, ...],
@@ -383,6 +433,7 @@ def local_command(
     dump_dir: Path,
     pdftotext: bool,
     pivot: bool,
+    rules: bool,
 ) -> None:
     """Extract invoice data from a local PDF without writing to Sheets."""
     state = State.load()
@@ -398,7 +449,7 @@ def local_command(
 
     extracted_text: str | None = None
     uses_ollama = any(name.startswith("ollama/") for name in model_names)
-    if pdftotext or uses_ollama:
+    if pdftotext or uses_ollama or rules:
         try:
             result = subprocess.run(
                 ["pdftotext", str(pdf_path), "-"],
@@ -419,6 +470,8 @@ def local_command(
             model=model_name,
             dump_enabled=dump,
             dump_dir=dump_dir,
+            rule_based=rules,
+            session=openrouter_session,
         )
         try:
             extracted = service.extract_invoice_data(
@@ -442,45 +495,37 @@ def local_command(
                 "model": f"ollama/{model_name}",
                 "error": "pdftotext is required for ollama models",
             }
-        required_keys = ", ".join(
-            [
-                "invoice_number",
-                "invoice_date",
-                "company",
-                "product",
-                "total_value",
-                "currency",
-                "taxes_paid",
-                "language",
-            ]
-        )
-        prompt = build_invoice_prompt(required_keys)
         body = {
             "model": model_name,
-            "prompt": f"{prompt}\nExtracted text:\n{extracted_text}",
+            "prompt": f"{INVOICE_PROMPT}\nExtracted text:\n{extracted_text}",
             "stream": False,
             "format": "json",
         }
         try:
-            response = requests.post(
+            response = ollama_session.post(
                 f"{ollama_url.rstrip('/')}/api/generate",
                 json=body,
                 timeout=120,
             )
             response.raise_for_status()
-            payload = response.json()
+            payload = orjson.loads(response.content)
             content = payload.get("response", "")
-            data = json.loads(content)
+            data = orjson.loads(content)
             return {
                 "model": f"ollama/{model_name}",
                 "invoice": data,
                 "usage": None,
                 "headers": None,
             }
-        except (requests.RequestException, json.JSONDecodeError, ValueError) as e:
+        except (requests.RequestException, ValueError) as e:
             return {"model": f"ollama/{model_name}", "error": str(e)}
 
-    with PoolExecutor(max_workers=max_workers) as executor:
+    # Models on the same backend share one keep-alive connection pool.
+    with (
+        OpenRouterService.build_session() as openrouter_session,
+        requests.Session() as ollama_session,
+        PoolExecutor(max_workers=max_workers) as executor,
+    ):
         futures = {}
         ordered: list[dict | None] = [None] * len(models)
         for index, model_name in enumerate(models):
@@ -0,0 +1,74 @@
+"""On-disk cache of extraction results keyed by PDF content."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """Store one JSON file per extraction, expiring after a fixed TTL."""
+
+    TTL = timedelta(days=7)
+
+    def __init__(self, cache_dir: Path, ttl: timedelta = TTL):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(digest: str, *parts: str) -> str:
+        """Build a cache key from a PDF digest and whatever shaped the result.
+
+        ``digest`` comes from ``pdf_digest`` so callers that already hashed the
+        PDF do not hash it again; ``parts`` carries provider, model and prompt
+        version.
+        """
+        key = "\0".join((*parts, digest))
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached value for ``key``, or None when missing or expired."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_bytes())
+            expires_at = datetime.fromisoformat(entry["expires_at"])
+            expired = expires_at <= datetime.now(timezone.utc)
+            value = entry["value"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+        if expired:
+            logger.debug(f"Cache entry {path} expired at {expires_at}")
+            return None
+        if not isinstance(value, dict):
+            logger.warning(f"Ignoring cache entry {path}: value is not an object")
+            return None
+        return value
+
+    def put(self, key: str, value: dict) -> None:
+        """Write ``value`` under ``key``, replacing any previous entry atomically."""
+        created_at = datetime.now(timezone.utc)
+        entry = {
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "expires_at": (created_at + self.ttl).isoformat(timespec="seconds"),
+            "value": value,
+        }
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry for {key}: {e}")
@@ -17,12 +17,34 @@ load_dotenv()
 
 STATE_FILE = Path.home() / ".invoice_scanner_state.json"
 
-DATE_DD_MM_YYYY_RE = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})")
-DATE_YYYY_MM_DD_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+DATE_DD_MM_YYYY_RE = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})", re.ASCII)
+DATE_YYYY_MM_DD_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})", re.ASCII)
+MISSING_VALUES = frozenset({"n/a", "unknown", ""})
 
 logger = logging.getLogger(__name__)
 
 
+def _fast_parse_date(value: str) -> str | None:
+    """Normalize fixed-width DD.MM.YYYY or YYYY-MM-DD dates without regex."""
+    if len(value) != 10 or not value.isascii():
+        return None
+    if value[2] == "." and value[5] == ".":
+        day, month, year = value[:2], value[3:5], value[6:]
+        if day.isdigit() and month.isdigit() and year.isdigit():
+            return f"{year}-{month}-{day}"
+        return None
+    year, month, day = value[:4], value[5:7], value[8:]
+    if (
+        value[4] == "-"
+        and value[7] == "-"
+        and year.isdigit()
+        and month.isdigit()
+        and day.isdigit()
+    ):
+        return value
+    return None
+
+
 class InvoiceExtract(BaseModel):
     """Data structure for extracted invoice information."""
 
@@ -51,12 +73,16 @@ class InvoiceExtract(BaseModel):
         if not value:
             return value
 
-        dd_mm_yyyy = DATE_DD_MM_YYYY_RE.match(value)
+        fast = _fast_parse_date(value)
+        if fast is not None:
+            return fast
+
+        dd_mm_yyyy = DATE_DD_MM_YYYY_RE.fullmatch(value[:10])
         if dd_mm_yyyy:
             day, month, year = dd_mm_yyyy.groups()
             return f"{year}-{month}-{day}"
 
-        yyyy_mm_dd = DATE_YYYY_MM_DD_RE.match(value)
+        yyyy_mm_dd = DATE_YYYY_MM_DD_RE.fullmatch(value[:10])
         if yyyy_mm_dd:
             return value
         for fmt in ("%B %d, %Y", "%b %d, %Y"):
@@ -75,7 +101,7 @@ class InvoiceExtract(BaseModel):
     def _require_non_unknown(cls, value: str) -> str:
         if value is None:
             raise ValueError("Required field is missing")
-        if isinstance(value, str) and value.strip().lower() in {"n/a", "unknown", ""}:
+        if isinstance(value, str) and value.strip().lower() in MISSING_VALUES:
             raise ValueError("Required field is missing")
         return value
 
@@ -93,6 +119,7 @@ class State(BaseModel):
     refresh_token: str | None = None
     access_token: str | None = None
     token_expiry: str | None = None
+    headers_installed: dict[str, list[str]] = Field(default_factory=dict)
 
     def to_dict(self) -> dict[str, Any]:
         return self.model_dump()
@@ -137,6 +164,8 @@ class AppSettings(BaseSettings):
     drive_folder_id: str = ""
     spreadsheet_id: str = ""
     sheet_name: str = "Invoices"
+    extraction_workers: int = Field(default=5, ge=1)
+    extraction_cache_dir: Path | None = None
 
 
 class Config:
@@ -155,6 +184,8 @@ class Config:
         )
         self.spreadsheet_id = state.spreadsheet_id or self.app_settings.spreadsheet_id
         self.sheet_name = state.sheet_name or self.app_settings.sheet_name
+        self.extraction_workers = self.app_settings.extraction_workers
+        self.extraction_cache_dir = self.app_settings.extraction_cache_dir
         self.state = state
 
         self.oauth2_client_config = self._load_oauth2_config()
@@ -1,9 +1,11 @@
 """Google Drive service wrapper."""
 
 import logging
+import threading
 import time
 
 from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import Resource
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 
@@ -16,7 +18,17 @@ class GoogleDriveService:
     """Service for interacting with Google Drive."""
 
     def __init__(self, credentials: Credentials):
-        self.service = build_drive_service(credentials)
+        self.credentials = credentials
+        self._local = threading.local()
+
+    @property
+    def service(self) -> Resource:
+        """Return this thread's Drive client; discovery clients are not thread-safe."""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = build_drive_service(self.credentials)
+            self._local.service = service
+        return service
 
     def _list_files(
         self, query: str, fields: str, page_token: str | None
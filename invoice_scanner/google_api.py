@@ -1,14 +1,39 @@
 """Google API client helpers."""
 
+import orjson
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import Resource, build
+from googleapiclient.model import JsonModel
+
+
+class OrjsonModel(JsonModel):
+    """JsonModel that encodes and decodes bodies with orjson."""
+
+    def serialize(self, body_value):
+        if (
+            isinstance(body_value, dict)
+            and "data" not in body_value
+            and self._data_wrapper
+        ):
+            body_value = {"data": body_value}
+        # UTF-8 bytes: httplib2 would latin-1 encode a str body.
+        return orjson.dumps(body_value)
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and "data" in body:
+            body = body["data"]
+        return body
 
 
 def build_drive_service(credentials: Credentials) -> Resource:
     """Create a Google Drive API client."""
-    return build("drive", "v3", credentials=credentials)
+    return build("drive", "v3", credentials=credentials, model=OrjsonModel())
 
 
 def build_sheets_service(credentials: Credentials) -> Resource:
     """Create a Google Sheets API client."""
-    return build("sheets", "v4", credentials=credentials)
+    return build("sheets", "v4", credentials=credentials, model=OrjsonModel())
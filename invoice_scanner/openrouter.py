@@ -4,21 +4,24 @@ import base64
 import json
 import logging
 import os
+import re
 import time
 from datetime import datetime
 from pathlib import Path
 
+import orjson
 import requests
 from pydantic import ValidationError
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from .cache import ExtractionCache
 from .config import DATE_DD_MM_YYYY_RE, InvoiceExtract
-from .utils import strip_code_fences
+from .utils import pdf_digest, strip_code_fences
 
 logger = logging.getLogger(__name__)
 
-ALLOWED_SCHEMA_KEYS = {
+REQUIRED_KEYS = (
     "invoice_number",
     "invoice_date",
     "company",
@@ -27,8 +30,51 @@ ALLOWED_SCHEMA_KEYS = {
     "currency",
     "taxes_paid",
     "language",
-}
+)
+ALLOWED_SCHEMA_KEYS = set(REQUIRED_KEYS)
 EXTRA_FIELDS_KEY = "extra_fields"
+_NON_EXTRA_KEYS = frozenset(ALLOWED_SCHEMA_KEYS | {EXTRA_FIELDS_KEY})
+
+_CURRENCY_TOKEN = r"€|\$|£|EUR|USD|GBP|CHF"
+_AMOUNT_TOKEN = r"\d[\d.,]*\d|\d"
+INVOICE_NUMBER_RE = re.compile(
+    r"\b(?:Rechnungsnummer|Rechnungs-?Nr\.?|Invoice\s+(?:Number|No\.?|#))"
+    r"\s*[:#]?\s*(?P<value>[A-Za-z0-9][\w./-]*)",
+    re.IGNORECASE,
+)
+INVOICE_DATE_RE = re.compile(
+    r"\b(?:Rechnungsdatum|Invoice\s+Date)\s*:?\s*"
+    r"(?P<value>\d{2}\.\d{2}\.\d{4}|\d{4}-\d{2}-\d{2})",
+    re.IGNORECASE,
+)
+COMPANY_RE = re.compile(
+    r"^\s*(?:Firma|Lieferant|Company|Vendor|Seller)\s*:\s*(?P<value>.+?)\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+PRODUCT_RE = re.compile(
+    r"^\s*(?:Leistung|Produkt|Beschreibung|Product|Service|Description)\s*:"
+    r"\s*(?P<value>.+?)\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+TOTAL_RE = re.compile(
+    r"\b(?:Gesamtbetrag|Rechnungsbetrag|Endbetrag|Total\s+Amount|Amount\s+Due|Total)"
+    rf"\s*:?\s*(?P<before>{_CURRENCY_TOKEN})?\s*(?P<value>{_AMOUNT_TOKEN})"
+    rf"\s*(?P<after>{_CURRENCY_TOKEN})?",
+    re.IGNORECASE,
+)
+TAX_RE = re.compile(
+    r"\b(?:MwSt|USt|Umsatzsteuer|Mehrwertsteuer|VAT|Tax)\b\.?"
+    r"(?:\s*\d{1,2}(?:[.,]\d+)?\s*%)?"
+    rf"\s*:?\s*(?:{_CURRENCY_TOKEN})?\s*(?P<value>{_AMOUNT_TOKEN})",
+    re.IGNORECASE,
+)
+GERMAN_LABEL_RE = re.compile(
+    r"\b(?:Rechnung\w*|MwSt|USt|Gesamtbetrag)\b", re.IGNORECASE
+)
+CURRENCY_ALIASES = {"€": "EUR", "EURO": "EUR", "Euro": "EUR", "$": "USD", "£": "GBP"}
+LANGUAGE_DATE_HINTS = ((DATE_DD_MM_YYYY_RE, "de"),)
+DEFAULT_LANGUAGE = "en"
+PDF_DATA_URL_PREFIX = "data:application/pdf;base64,"
 
 
 def build_invoice_prompt(required_keys: str) -> str:
@@ -47,11 +93,99 @@ Important:
 """
 
 
+def _normalize_amount(value: str) -> str | None:
+    """Convert German (1.234,56) or English (1,234.56) amounts to 1234.56.
+
+    A separator followed by exactly three digits with no other decimal mark
+    (1.190, 1,190, 1.234.567) is read as a thousands separator. Returns None
+    when the separators do not fit either layout, so callers can defer to the
+    model instead of guessing.
+    """
+    last = max(value.rfind(","), value.rfind("."))
+    if last == -1:
+        return value
+
+    integer, fraction = value[:last], value[last + 1 :]
+    decimal_mark = value[last]
+    thousands_mark = "." if decimal_mark == "," else ","
+    if decimal_mark in integer or (
+        len(fraction) == 3 and thousands_mark not in integer
+    ):
+        # Every separator is a thousands separator.
+        integer, fraction = value, ""
+        thousands_mark = decimal_mark
+    elif not 1 <= len(fraction) <= 2:
+        return None
+
+    groups = integer.split(thousands_mark)
+    if len(groups) > 1 and not 1 <= len(groups[0]) <= 3:
+        return None
+    if any(len(group) != 3 or not group.isdigit() for group in groups[1:]):
+        return None
+    digits = "".join(groups)
+    if not digits.isdigit():
+        return None
+    return f"{digits}.{fraction}" if fraction else digits
+
+
+def _pdf_data_url(pdf_content: bytes) -> str:
+    """Encode a PDF as a base64 data URL.
+
+    The encoded bytes are not bound to a name, so only the final URL string
+    stays alive for the duration of the request.
+    """
+    return PDF_DATA_URL_PREFIX + base64.b64encode(pdf_content).decode("ascii")
+
+
+INVOICE_PROMPT = build_invoice_prompt(", ".join(REQUIRED_KEYS))
+# Bump whenever the prompt or schema changes so cached extractions are not reused.
+PROMPT_VERSION = "v2"
+
+
+def _build_invoice_schema() -> dict:
+    """Build the response schema from the fields the model is asked to fill.
+
+    Drive metadata and ``extra_fields`` are stamped on after extraction, so
+    they are left out rather than spent as prompt tokens on every request.
+    """
+    schema = InvoiceExtract.model_json_schema()
+    properties = {
+        key: value
+        for key, value in schema["properties"].items()
+        if key in ALLOWED_SCHEMA_KEYS
+    }
+    return {
+        "title": schema["title"],
+        "type": "object",
+        "properties": properties,
+        "required": [key for key in schema["required"] if key in properties],
+    }
+
+
+_INVOICE_SCHEMA = _build_invoice_schema()
+_RESPONSE_FORMAT = {"type": "json_schema", "json_schema": _INVOICE_SCHEMA}
+# The prompt is the same for every invoice, so it goes first and is marked as a
+# cacheable prefix; only the user message after it changes per file.
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": [
+        {
+            "type": "text",
+            "text": INVOICE_PROMPT,
+            "cache_control": {"type": "ephemeral"},
+        }
+    ],
+}
+
+
 class OpenRouterService:
     """Service for extracting data using OpenRouter."""
 
     API_URL = "https://openrouter.ai/api/v1/chat/completions"
     MODEL = "google/gemini-2.5-flash-lite"
+    POOL_MAXSIZE = 32
+    MAX_PARSE_ATTEMPTS = 3
+    PARSE_RETRY_DELAY = 1.0
 
     def __init__(
         self,
@@ -59,6 +193,9 @@ class OpenRouterService:
         model: str | None = None,
         dump_enabled: bool = False,
         dump_dir: Path | None = None,
+        rule_based: bool = False,
+        cache_dir: Path | None = None,
+        session: requests.Session | None = None,
     ):
         self.api_key = api_key
         self.model = model or self.MODEL
@@ -66,6 +203,8 @@ class OpenRouterService:
         self.last_headers: dict | None = None
         self.dump_enabled = dump_enabled
         self.dump_dir = dump_dir or Path("/tmp/invoice-scout")
+        self.rule_based = rule_based
+        self.cache = ExtractionCache(cache_dir) if cache_dir else None
         app_url = os.getenv(
             "OPENROUTER_APP_URL", "https://github.com/jaysonsantos/invoice-scout"
         )
@@ -76,10 +215,33 @@ class OpenRouterService:
             "HTTP-Referer": app_url,
             "X-Title": app_title,
         }
-        self.session = self._build_session()
+        # Callers running several services side by side can pass one session
+        # so they all reuse the same keep-alive pool.
+        self.session = session or self.build_session()
+        self._payload_template = self._build_payload_template()
 
-    def _build_session(self) -> requests.Session:
-        """Create a requests session with retry/backoff."""
+    def _build_payload_template(self) -> dict:
+        """Build the request fields that are identical for every invoice."""
+        max_tokens = 1000
+        if self.model.startswith("openai/gpt-5"):
+            max_tokens = 2000
+
+        template = {
+            "model": self.model,
+            "temperature": 0.1,
+            "max_tokens": max_tokens,
+            "cache_control": {"type": "ephemeral"},
+            "response_format": _RESPONSE_FORMAT,
+        }
+        if self.model.startswith("openai/gpt-5"):
+            template["reasoning"] = {"effort": "minimal"}
+        if self.model.startswith("mistralai/"):
+            template.pop("response_format", None)
+        return template
+
+    @classmethod
+    def build_session(cls) -> requests.Session:
+        """Create a pooled keep-alive session with retry/backoff."""
         retry = Retry(
             total=3,
             connect=3,
@@ -90,7 +252,9 @@ class OpenRouterService:
             allowed_methods={"POST"},
             raise_on_status=False,
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=cls.POOL_MAXSIZE, max_retries=retry
+        )
         session = requests.Session()
         session.mount("https://", adapter)
         session.mount("http://", adapter)
@@ -101,106 +265,221 @@ class OpenRouterService:
         pdf_content: bytes,
         file_name: str,
         extracted_text: str | None = None,
+        digest: str | None = None,
+        lookup_cache: bool = True,
     ) -> InvoiceExtract:
-        """Extract invoice data from PDF using OpenRouter."""
-        required_keys = ", ".join(
-            [
-                "invoice_number",
-                "invoice_date",
-                "company",
-                "product",
-                "total_value",
-                "currency",
-                "taxes_paid",
-                "language",
-            ]
-        )
-
-        prompt = build_invoice_prompt(required_keys)
-
-        schema = InvoiceExtract.model_json_schema()
+        """Extract invoice data from PDF using OpenRouter.
+
+        Pass ``digest`` when the caller already ran ``pdf_digest`` on the PDF,
+        and ``lookup_cache=False`` when it already checked ``cached_invoice``.
+        """
+        if self.rule_based and extracted_text is not None:
+            invoice = self._extract_rule_based(extracted_text, file_name)
+            if invoice is not None:
+                return invoice
+
+        cache_key: str | None = None
+        if self.cache is not None:
+            cache_key = self._cache_key(
+                digest or pdf_digest(pdf_content), extracted_text
+            )
+            if lookup_cache:
+                cached = self._load_cached(cache_key, file_name)
+                if cached is not None:
+                    return cached
 
-        messages = [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}],
-            }
-        ]
         if extracted_text is not None:
-            messages[0]["content"].append(
-                {
-                    "type": "text",
-                    "text": f"Extracted text:\n{extracted_text}",
-                }
-            )
+            user_part = {
+                "type": "text",
+                "text": f"Extracted text:\n{extracted_text}",
+            }
         else:
-            pdf_base64 = base64.b64encode(pdf_content).decode("utf-8")
-            messages[0]["content"].append(
-                {
-                    "type": "file",
-                    "file": {
-                        "filename": file_name,
-                        "file_data": f"data:application/pdf;base64,{pdf_base64}",
-                    },
-                }
-            )
-
-        max_tokens = 1000
-        if self.model.startswith("openai/gpt-5"):
-            max_tokens = 2000
+            user_part = {
+                "type": "file",
+                "file": {
+                    "filename": file_name,
+                    "file_data": _pdf_data_url(pdf_content),
+                },
+            }
 
         payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.1,
-            "max_tokens": max_tokens,
-            "response_format": {
-                "type": "json_schema",
-                "json_schema": schema,
-            },
+            **self._payload_template,
+            "messages": [_SYSTEM_MESSAGE, {"role": "user", "content": [user_part]}],
         }
-        if self.model.startswith("openai/gpt-5"):
-            payload["reasoning"] = {"effort": "minimal"}
-        if self.model.startswith("mistralai/"):
-            payload.pop("response_format", None)
 
-        dump_paths = self._dump_input(file_name, prompt, schema, payload)
+        dump_paths = self._dump_input(
+            file_name, INVOICE_PROMPT, _INVOICE_SCHEMA, payload
+        )
+        # Each attempt sends a fresh payload dict, so what was sent earlier is
+        # never mutated by a later retry.
+        for attempt in range(1, self.MAX_PARSE_ATTEMPTS + 1):
+            result = self._complete(payload, file_name, dump_paths)
+            content: str | None = None
+            try:
+                content = self._extract_content(result)
+                finish_reason = self._extract_finish_reason(result)
+                if attempt < self.MAX_PARSE_ATTEMPTS:
+                    if finish_reason == "length":
+                        logger.warning(
+                            "Finish reason was length; retrying with higher max_tokens"
+                        )
+                        payload = {
+                            **payload,
+                            "max_tokens": max(payload["max_tokens"] * 2, 2000),
+                        }
+                        continue
+                    if not content.strip():
+                        logger.warning("Empty content received; retrying")
+                        continue
+                normalized_data = self._normalize_extracted_data(
+                    self._parse_response_json(content)
+                )
+                invoice = self._validate_invoice(normalized_data)
+                break
+            except ValueError as e:
+                if attempt == self.MAX_PARSE_ATTEMPTS:
+                    raise
+                logger.warning(
+                    f"Unusable reply for {file_name} on attempt {attempt}; "
+                    "asking the model to correct it"
+                )
+                if content and content.strip():
+                    payload = {
+                        **payload,
+                        "messages": [
+                            *payload["messages"],
+                            *self._feedback_messages(content, e),
+                        ],
+                    }
+                time.sleep(self.PARSE_RETRY_DELAY * attempt)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, normalized_data)
+        return invoice
+
+    def _complete(
+        self, payload: dict, file_name: str, dump_paths: dict[str, Path] | None
+    ) -> dict:
+        """Send one completion request and log and dump what came back."""
         result, headers = self._send_or_raise(payload)
         actual_model = result.get("model", "unknown")
         logger.info(f"OpenRouter used model: {actual_model} for {file_name}")
         self._log_usage(result.get("usage"), headers)
         self._dump_output(dump_paths, result, headers, actual_model)
+        return result
+
+    @staticmethod
+    def _feedback_messages(content: str, error: ValueError) -> list[dict]:
+        """Build the follow-up turn that shows the model why its reply failed."""
+        detail = error.__cause__ or error
+        return [
+            {"role": "assistant", "content": content},
+            {
+                "role": "user",
+                "content": (
+                    f"Your output had an error: {detail}. "
+                    "Fix it and reply with only the corrected JSON object."
+                ),
+            },
+        ]
+
+    def cached_invoice(
+        self,
+        digest: str,
+        file_name: str,
+        extracted_text: str | None = None,
+    ) -> InvoiceExtract | None:
+        """Return a previously cached extraction for a PDF digest, if any."""
+        if self.cache is None:
+            return None
+        return self._load_cached(self._cache_key(digest, extracted_text), file_name)
+
+    def _load_cached(self, cache_key: str, file_name: str) -> InvoiceExtract | None:
+        """Validate a cache entry, treating anything unusable as a miss."""
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        try:
+            invoice = InvoiceExtract.model_validate(cached)
+        except ValidationError as e:
+            logger.warning(f"Ignoring invalid cached extraction for {file_name}: {e}")
+            return None
+        logger.info(f"Using cached extraction for {file_name}")
+        return invoice
+
+    def _cache_key(self, digest: str, extracted_text: str | None) -> str:
+        """Key an extraction by PDF digest and everything that shapes the reply."""
+        return ExtractionCache.make_key(
+            digest,
+            "openrouter",
+            self.model,
+            PROMPT_VERSION,
+            "file" if extracted_text is None else "text",
+        )
 
-        content = self._extract_content(result)
-        finish_reason = self._extract_finish_reason(result)
-        if finish_reason == "length":
-            logger.warning("Finish reason was length; retrying with higher max_tokens")
-            payload["max_tokens"] = max(payload["max_tokens"] * 2, 2000)
-        if not content.strip() or finish_reason == "length":
-            if not content.strip() and finish_reason != "length":
-                logger.warning("Empty content received; retrying once")
-            result, headers = self._send_or_raise(payload)
-            actual_model = result.get("model", actual_model)
-            logger.info(f"OpenRouter used model: {actual_model} for {file_name}")
-            self._log_usage(result.get("usage"), headers)
-            self._dump_output(dump_paths, result, headers, actual_model)
-            content = self._extract_content(result)
-
-        extracted_data = self._parse_response_json(content)
-        normalized_data = self._normalize_extracted_data(extracted_data)
-        return self._validate_invoice(normalized_data)
+    def _extract_rule_based(
+        self, extracted_text: str, file_name: str
+    ) -> InvoiceExtract | None:
+        """Extract a well-labelled invoice from text without calling the LLM."""
+        candidate = self._try_rule_based(extracted_text)
+        if candidate is None:
+            return None
+        try:
+            invoice = InvoiceExtract.model_validate(
+                self._normalize_extracted_data(candidate)
+            )
+        except ValidationError as e:
+            logger.debug(f"Rule-based candidate for {file_name} rejected: {e}")
+            return None
+        logger.info(f"Rule-based extraction matched all fields for {file_name}")
+        return invoice
+
+    @staticmethod
+    def _try_rule_based(extracted_text: str) -> dict | None:
+        """Match labelled invoice fields; return None unless all keys are found."""
+        matches = {
+            "invoice_number": INVOICE_NUMBER_RE.search(extracted_text),
+            "invoice_date": INVOICE_DATE_RE.search(extracted_text),
+            "company": COMPANY_RE.search(extracted_text),
+            "product": PRODUCT_RE.search(extracted_text),
+            "total_value": TOTAL_RE.search(extracted_text),
+            "taxes_paid": TAX_RE.search(extracted_text),
+        }
+        if not all(matches.values()):
+            return None
+
+        total = matches["total_value"]
+        currency = total.group("before") or total.group("after")
+        if not currency:
+            return None
+
+        candidate = {key: match.group("value") for key, match in matches.items()}
+        total_value = _normalize_amount(candidate["total_value"])
+        taxes_paid = _normalize_amount(candidate["taxes_paid"])
+        if total_value is None or taxes_paid is None:
+            return None
+        candidate["total_value"] = total_value
+        candidate["taxes_paid"] = taxes_paid
+        candidate["currency"] = CURRENCY_ALIASES.get(currency, currency.upper())
+        candidate["language"] = (
+            "de" if GERMAN_LABEL_RE.search(extracted_text) else DEFAULT_LANGUAGE
+        )
+        return candidate
 
     def _send_request(self, payload: dict) -> tuple[dict, dict]:
         """Send request to OpenRouter API and return response dict and headers."""
         response = self.session.post(
-            self.API_URL, headers=self.headers, json=payload, timeout=120
+            self.API_URL,
+            data=orjson.dumps(payload),
+            headers=self.headers,
+            timeout=120,
         )
         if not response.ok:
             logger.error(
                 "OpenRouter error %s: %s", response.status_code, response.text.strip()
             )
         response.raise_for_status()
-        return response.json(), dict(response.headers)
+        return orjson.loads(response.content), dict(response.headers)
 
     def _send_or_raise(self, payload: dict) -> tuple[dict, dict]:
         """Send request and wrap transport errors."""
@@ -209,16 +488,20 @@ class OpenRouterService:
             if isinstance(result, tuple):
                 return result
             return result, {}
-        except requests.RequestException as e:
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
             logger.exception(f"OpenRouter API error: {e}")
             raise ValueError(f"ERROR: {e}") from e
 
     def _extract_content(self, result: dict) -> str:
         """Extract content from OpenRouter response."""
-        choices = result.get("choices", [])
+        choices = result.get("choices")
         if not choices:
             raise ValueError("NO_CHOICES")
-        return choices[0]["message"]["content"]
+        content = (choices[0].get("message") or {}).get("content")
+        if content is None:
+            logger.error(f"Response choice carried no message content: {choices[0]}")
+            raise ValueError("PARSE_ERROR")
+        return content
 
     def _extract_finish_reason(self, result: dict) -> str | None:
         """Extract finish reason from OpenRouter response."""
@@ -259,8 +542,8 @@ class OpenRouterService:
         if not content or not content.strip():
             logger.error("Raw content was empty or whitespace")
         try:
-            return json.loads(strip_code_fences(content))
-        except json.JSONDecodeError as e:
+            parsed = orjson.loads(strip_code_fences(content))
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON response: {e}")
             logger.error(
                 "Raw content that failed parsing (length=%s):\n%r",
@@ -268,6 +551,10 @@ class OpenRouterService:
                 content,
             )
             raise ValueError("PARSE_ERROR") from e
+        if not isinstance(parsed, dict):
+            logger.error(f"Expected a JSON object, got {type(parsed).__name__}")
+            raise ValueError("SCHEMA_ERROR")
+        return parsed
 
     def _validate_invoice(self, extracted_data: dict) -> InvoiceExtract:
         """Validate parsed invoice data."""
@@ -300,10 +587,10 @@ class OpenRouterService:
                     {
                         "model": self.model,
                         "file_name": file_name,
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": datetime.now().isoformat(timespec="seconds"),
                         "prompt": prompt,
                         "schema": schema,
-                        "payload": payload,
+                        "payload": self._elide_file_data(payload),
                     },
                     f,
                     indent=2,
@@ -318,6 +605,22 @@ class OpenRouterService:
         )
         return {"input": input_path, "output": output_path}
 
+    @staticmethod
+    def _elide_file_data(payload: dict) -> dict:
+        """Copy the payload with inline PDF data replaced by its size."""
+        messages = []
+        for message in payload.get("messages", []):
+            content = []
+            for part in message.get("content", []):
+                file_part = part.get("file") if isinstance(part, dict) else None
+                if file_part and "file_data" in file_part:
+                    size = len(file_part["file_data"])
+                    file_part = {**file_part, "file_data": f"<elided {size} bytes>"}
+                    part = {**part, "file": file_part}
+                content.append(part)
+            messages.append({**message, "content": content})
+        return {**payload, "messages": messages}
+
     def _dump_output(
         self,
         dump_paths: dict[str, Path] | None,
@@ -334,7 +637,7 @@ class OpenRouterService:
                     {
                         "model": self.model,
                         "actual_model": actual_model,
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": datetime.now().isoformat(timespec="seconds"),
                         "response": result,
                         "headers": headers,
                     },
@@ -359,10 +662,17 @@ class OpenRouterService:
                 return candidate
             counter += 1
 
-    def _normalize_extracted_data(self, extracted_data: dict) -> dict:
-        """Normalize extracted data without introducing ambiguous fields."""
-        normalized = dict(extracted_data)
-
+    @staticmethod
+    def _guess_language(invoice_date: object) -> str:
+        """Guess the invoice language from locale-specific date formats."""
+        if isinstance(invoice_date, str):
+            for pattern, language in LANGUAGE_DATE_HINTS:
+                if pattern.fullmatch(invoice_date[:10]):
+                    return language
+        return DEFAULT_LANGUAGE
+
+    def _normalize_extracted_data(self, normalized: dict) -> dict:
+        """Normalize freshly parsed data in place without adding ambiguous fields."""
         if not normalized.get("company"):
             vendor_name = normalized.get("vendor_name")
             if isinstance(vendor_name, str) and vendor_name.strip():
@@ -397,20 +707,18 @@ class OpenRouterService:
                 normalized[key] = str(value)
 
         if not normalized.get("language"):
-            invoice_date = normalized.get("invoice_date", "")
-            if isinstance(invoice_date, str) and DATE_DD_MM_YYYY_RE.match(invoice_date):
-                normalized["language"] = "de"
-            else:
-                normalized["language"] = "en"
+            normalized["language"] = self._guess_language(
+                normalized.get("invoice_date")
+            )
 
         currency = normalized.get("currency")
-        if isinstance(currency, str) and currency.strip() in {"€", "EURO", "Euro"}:
-            normalized["currency"] = "EUR"
+        if isinstance(currency, str):
+            normalized["currency"] = CURRENCY_ALIASES.get(currency.strip(), currency)
 
         normalized[EXTRA_FIELDS_KEY] = {
             key: value
             for key, value in normalized.items()
-            if key not in ALLOWED_SCHEMA_KEYS | {EXTRA_FIELDS_KEY}
+            if key not in _NON_EXTRA_KEYS
         }
 
         return normalized
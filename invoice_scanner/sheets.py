@@ -1,7 +1,13 @@
 """Google Sheets service wrapper."""
 
+import logging
+import random
 import re
 import time
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import cached_property
+from operator import attrgetter
 
 from google.oauth2.credentials import Credentials
 from googleapiclient.errors import HttpError
@@ -10,6 +16,28 @@ from .config import InvoiceExtract
 from .google_api import build_sheets_service
 from .utils import sheet_name_for_date
 
+YEAR_SHEET_RE = re.compile(r"Invoices (\d{4})", re.ASCII)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Field order matches GoogleSheetsService.HEADERS.
+_ROW_GETTER = attrgetter(
+    "file_id",
+    "file_name",
+    "file_url",
+    "invoice_number",
+    "invoice_date",
+    "company",
+    "product",
+    "total_value",
+    "currency",
+    "taxes_paid",
+    "language",
+    "extraction_date",
+)
+_FILE_ID_GETTER = attrgetter("file_id")
+
+logger = logging.getLogger(__name__)
+
 
 class GoogleSheetsService:
     """Service for interacting with Google Sheets."""
@@ -29,168 +57,216 @@ class GoogleSheetsService:
         "Extraction Date",
     ]
 
-    def __init__(self, credentials: Credentials, spreadsheet_id: str):
+    MAX_ATTEMPTS = 6
+    BACKOFF_BASE = 0.5
+    BACKOFF_CAP = 30.0
+    RATE_LIMIT_BACKOFF_CAP = 60.0
+
+    def __init__(
+        self,
+        credentials: Credentials,
+        spreadsheet_id: str,
+        headers_installed: Iterable[str] = (),
+    ):
         self.spreadsheet_id = spreadsheet_id
         self.service = build_sheets_service(credentials)
-        self._sheet_titles: set[str] | None = None
-        self._headers_checked: set[str] = set()
+        self._spreadsheets = self.service.spreadsheets()
+        self._values = self._spreadsheets.values()
+        self._headers_checked: set[str] = set(headers_installed)
+        self._pending: defaultdict[str, list[InvoiceExtract]] = defaultdict(list)
+        self._processed_ids: set[str] | None = None
 
     def _execute_with_retry(self, request, action: str) -> dict:
         """Execute a Sheets request with retry/backoff on rate limits."""
-        max_attempts = 3
-        for attempt in range(1, max_attempts + 1):
+        delay = self.BACKOFF_BASE
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
             try:
                 return request.execute()
             except HttpError as e:
                 status = getattr(e.resp, "status", None)
-                if status not in {429, 500, 502, 503, 504} or attempt == max_attempts:
+                if status == 404:
+                    self.invalidate_titles()
+                if status not in RETRY_STATUSES or attempt == self.MAX_ATTEMPTS:
                     raise
-                backoff = 0.5 * (2 ** (attempt - 1))
-                time.sleep(backoff)
+                delay = self._retry_delay(e, delay)
+                logger.warning(
+                    f"Sheets request to {action} failed with {status}; "
+                    f"retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
         raise RuntimeError(f"Failed to {action} after retries")
 
-    def _load_sheet_titles(self) -> set[str]:
-        """Load and cache sheet titles for this spreadsheet."""
-        if self._sheet_titles is None:
-            spreadsheet = self._execute_with_retry(
-                self.service.spreadsheets().get(spreadsheetId=self.spreadsheet_id),
-                "load spreadsheet",
-            )
-            sheets = spreadsheet.get("sheets", [])
-            self._sheet_titles = {sheet["properties"]["title"] for sheet in sheets}
-        return self._sheet_titles
-
-    def _ensure_sheet_exists(self, sheet_name: str) -> None:
-        """Ensure the sheet exists, create it if not."""
-        titles = self._load_sheet_titles()
-        if sheet_name not in titles:
-            batch_update_body = {
-                "requests": [{"addSheet": {"properties": {"title": sheet_name}}}]
-            }
-            self._execute_with_retry(
-                self.service.spreadsheets().batchUpdate(
-                    spreadsheetId=self.spreadsheet_id, body=batch_update_body
-                ),
-                "create sheet",
-            )
-            titles.add(sheet_name)
-
-    def _ensure_headers(self, sheet_name: str) -> None:
-        """Ensure the sheet has proper headers."""
-        self._ensure_sheet_exists(sheet_name)
-        if sheet_name in self._headers_checked:
-            return
-        self._execute_with_retry(
-            self.service.spreadsheets()
-            .values()
-            .update(
-                spreadsheetId=self.spreadsheet_id,
-                range=f"{sheet_name}!A1",
-                valueInputOption="RAW",
-                body={"values": [self.HEADERS]},
-            ),
-            "ensure headers",
+    def _retry_delay(self, error: HttpError, previous: float) -> float:
+        """Honor Retry-After, else use decorrelated jitter capped per error kind."""
+        rate_limited = error.resp.status == 429 or b"RESOURCE_EXHAUSTED" in (
+            error.content or b""
         )
-        self._headers_checked.add(sheet_name)
+        cap = self.RATE_LIMIT_BACKOFF_CAP if rate_limited else self.BACKOFF_CAP
+        retry_after = error.resp.get("retry-after")
+        if retry_after is not None:
+            try:
+                return min(max(float(retry_after), 0.0), cap)
+            except ValueError:
+                pass
+        return random.uniform(self.BACKOFF_BASE, min(cap, previous * 3))
 
-    def get_processed_file_ids(self) -> set:
-        """Get set of already processed file IDs from all year sheets."""
-        all_file_ids = set()
-        spreadsheet = (
-            self.service.spreadsheets().get(spreadsheetId=self.spreadsheet_id).execute()
+    @cached_property
+    def _sheet_ids(self) -> dict[str, int]:
+        """Sheet IDs by title, loaded once and kept current as sheets are added."""
+        spreadsheet = self._execute_with_retry(
+            self._spreadsheets.get(spreadsheetId=self.spreadsheet_id),
+            "load spreadsheet",
         )
-        sheets = spreadsheet.get("sheets", [])
+        return {
+            sheet["properties"]["title"]: sheet["properties"]["sheetId"]
+            for sheet in spreadsheet.get("sheets", [])
+        }
+
+    @property
+    def headers_installed(self) -> set[str]:
+        """Sheets whose header row has been written, for persisting across runs."""
+        return set(self._headers_checked)
+
+    def invalidate_titles(self) -> None:
+        """Drop cached sheet metadata so the next access reloads it."""
+        self.__dict__.pop("_sheet_ids", None)
 
+    def _new_sheet_id(self, taken: set[int]) -> int:
+        """Pick a sheetId for addSheet that no known sheet uses."""
+        while True:
+            sheet_id = random.randrange(1, 2**31)
+            if sheet_id not in taken:
+                return sheet_id
+
+    def get_processed_file_ids(self) -> set[str]:
+        """Get set of already processed file IDs from all year sheets."""
+        if self._processed_ids is not None:
+            return self._processed_ids
+
+        all_file_ids: set[str] = set()
         invoice_sheets = []
-        for sheet in sheets:
-            title = sheet["properties"]["title"]
-            if re.match(r"^Invoices \d{4}$", title) or title == "Invoices Unknown":
+        for title in sorted(self._sheet_ids):
+            if title == "Invoices Unknown" or YEAR_SHEET_RE.fullmatch(title):
                 invoice_sheets.append(title)
 
-        for sheet_name in invoice_sheets:
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=f"{sheet_name}!A:A")
-                .execute()
-            )
-            values = result.get("values", [])
-            all_file_ids.update({row[0] for row in values[1:] if row})
+        if not invoice_sheets:
+            self._processed_ids = all_file_ids
+            return all_file_ids
 
+        result = self._execute_with_retry(
+            self._values.batchGet(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=[f"{sheet_name}!A2:A" for sheet_name in invoice_sheets],
+                valueRenderOption="UNFORMATTED_VALUE",
+            ),
+            "load processed file IDs",
+        )
+        for value_range in result.get("valueRanges", []):
+            values = value_range.get("values", [])
+            all_file_ids.update(str(row[0]) for row in values if row)
+
+        self._processed_ids = all_file_ids
         return all_file_ids
 
     def append_invoice(self, invoice: InvoiceExtract, invoice_date: str) -> None:
-        """Append invoice data to the appropriate year-specific sheet."""
-        sheet_name = sheet_name_for_date(invoice_date)
-        self._ensure_headers(sheet_name)
-
-        row = [
-            invoice.file_id,
-            invoice.file_name,
-            invoice.file_url,
-            invoice.invoice_number,
-            invoice.invoice_date,
-            invoice.company,
-            invoice.product,
-            invoice.total_value,
-            invoice.currency,
-            invoice.taxes_paid,
-            invoice.language,
-            invoice.extraction_date,
-        ]
-
-        self._execute_with_retry(
-            self.service.spreadsheets()
-            .values()
-            .append(
-                spreadsheetId=self.spreadsheet_id,
-                range=sheet_name,
-                valueInputOption="RAW",
-                insertDataOption="INSERT_ROWS",
-                body={"values": [row]},
+        """Queue invoice data for the year-specific sheet until the next flush."""
+        self._pending[sheet_name_for_date(invoice_date)].append(invoice)
+
+    def flush(self) -> set[str]:
+        """Write all queued invoices in one batch update and return their IDs."""
+        if not self._pending:
+            return set()
+
+        sheet_ids = self._sheet_ids
+        new_sheet_ids: dict[str, int] = {}
+        batch_requests = []
+        for sheet_name, items in self._pending.items():
+            sheet_id = sheet_ids.get(sheet_name)
+            if sheet_id is None:
+                # Choosing the ID lets the header and rows target the new sheet
+                # in the same batch as its addSheet.
+                sheet_id = self._new_sheet_id(
+                    {*sheet_ids.values(), *new_sheet_ids.values()}
+                )
+                new_sheet_ids[sheet_name] = sheet_id
+                self._headers_checked.discard(sheet_name)
+                batch_requests.append(
+                    {
+                        "addSheet": {
+                            "properties": {"title": sheet_name, "sheetId": sheet_id}
+                        }
+                    }
+                )
+            if sheet_name not in self._headers_checked:
+                batch_requests.append(
+                    {
+                        "updateCells": {
+                            "start": {"sheetId": sheet_id, "rowIndex": 0},
+                            "rows": [self._row_data(self.HEADERS)],
+                            "fields": "userEnteredValue",
+                        }
+                    }
+                )
+            batch_requests.append(
+                {
+                    "appendCells": {
+                        "sheetId": sheet_id,
+                        "rows": [
+                            self._row_data(_ROW_GETTER(invoice)) for invoice in items
+                        ],
+                        "fields": "userEnteredValue",
+                    }
+                }
+            )
+
+        response = self._execute_with_retry(
+            self._spreadsheets.batchUpdate(
+                spreadsheetId=self.spreadsheet_id, body={"requests": batch_requests}
             ),
-            "append invoice",
+            "append invoice batch",
         )
+        # Cache what Sheets actually created rather than what was requested.
+        for reply in response.get("replies", []):
+            if "addSheet" in reply:
+                properties = reply["addSheet"]["properties"]
+                sheet_ids[properties["title"]] = properties["sheetId"]
+        self._headers_checked.update(self._pending)
+        appended = {
+            file_id
+            for items in self._pending.values()
+            for file_id in map(_FILE_ID_GETTER, items)
+            if file_id
+        }
+        self._pending.clear()
+        if self._processed_ids is not None:
+            self._processed_ids |= appended
+        return appended
 
-    def append_invoices_batch(self, invoices: list[InvoiceExtract]) -> set[str]:
-        """Append invoices grouped by sheet and return appended file IDs."""
-        grouped: dict[str, list[InvoiceExtract]] = {}
-        for invoice in invoices:
-            sheet_name = sheet_name_for_date(invoice.invoice_date)
-            grouped.setdefault(sheet_name, []).append(invoice)
-
-        appended: set[str] = set()
-        for sheet_name, items in grouped.items():
-            self._ensure_headers(sheet_name)
-            rows = [
-                [
-                    invoice.file_id,
-                    invoice.file_name,
-                    invoice.file_url,
-                    invoice.invoice_number,
-                    invoice.invoice_date,
-                    invoice.company,
-                    invoice.product,
-                    invoice.total_value,
-                    invoice.currency,
-                    invoice.taxes_paid,
-                    invoice.language,
-                    invoice.extraction_date,
-                ]
-                for invoice in items
+    def append_invoices_batch(
+        self, invoices: list[InvoiceExtract], known_ids: set[str] | None = None
+    ) -> set[str]:
+        """Append invoices not in known_ids grouped by sheet; return appended IDs."""
+        if known_ids:
+            fresh = [
+                invoice for invoice in invoices if invoice.file_id not in known_ids
             ]
-            self._execute_with_retry(
-                self.service.spreadsheets()
-                .values()
-                .append(
-                    spreadsheetId=self.spreadsheet_id,
-                    range=sheet_name,
-                    valueInputOption="RAW",
-                    insertDataOption="INSERT_ROWS",
-                    body={"values": rows},
-                ),
-                "append invoice batch",
-            )
-            appended.update({invoice.file_id for invoice in items if invoice.file_id})
+            if skipped := len(invoices) - len(fresh):
+                logger.info(f"Skipping {skipped} already recorded invoices")
+            invoices = fresh
+        for invoice in invoices:
+            self.append_invoice(invoice, invoice.invoice_date)
+        return self.flush()
 
-        return appended
+    @staticmethod
+    def _row_data(values: Iterable[str | None]) -> dict:
+        """Convert row values to Sheets RowData, storing strings unparsed."""
+        return {
+            "values": [
+                (
+                    {"userEnteredValue": {"stringValue": value}}
+                    if value is not None
+                    else {}
+                )
+                for value in values
+            ]
+        }
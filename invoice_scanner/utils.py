@@ -2,39 +2,52 @@
 
 from __future__ import annotations
 
+import hashlib
+import re
+from functools import lru_cache
+
+# An unterminated fence still yields its body, matching truncated replies.
+_FENCE_RE = re.compile(r"```(?:json)?\s*(?P<body>.*?)\s*(?:```|\Z)", re.DOTALL)
+
 
 def strip_code_fences(content: str) -> str:
     """Remove optional markdown code fences around JSON content."""
     if not content:
         return content
 
-    stripped = content.strip()
-    if stripped.startswith("```"):
-        stripped = stripped[3:]
-        if stripped.startswith("json"):
-            stripped = stripped[4:]
-        if stripped.endswith("```"):
-            stripped = stripped[:-3]
-    stripped = stripped.strip()
+    # Fence markers sit outside the JSON braces, so the brace slice covers
+    # fenced and unfenced replies alike without copying the whole buffer.
+    start = content.find("{")
+    end = content.rfind("}")
+    if start != -1 and start < end:
+        return content[start : end + 1]
+
+    fenced = _FENCE_RE.search(content)
+    return fenced.group("body") if fenced else content.strip()
+
 
-    if "{" in stripped and "}" in stripped:
-        start = stripped.find("{")
-        end = stripped.rfind("}")
-        if start < end:
-            stripped = stripped[start : end + 1]
+def pdf_digest(pdf_content: bytes) -> str:
+    """Return the length-prefixed SHA-256 hex digest identifying a PDF.
 
-    return stripped.strip()
+    The prefix and the bytes go through one hash object instead of being
+    concatenated, so large PDFs are hashed in place without a copy.
+    """
+    digest = hashlib.sha256(len(pdf_content).to_bytes(8, "big"))
+    digest.update(pdf_content)
+    return digest.hexdigest()
 
 
+@lru_cache(maxsize=4096)
 def extract_year(invoice_date: str | None) -> str:
     """Extract a 4-digit year from an invoice date or return 'Unknown'."""
     if not invoice_date or len(invoice_date) < 4:
         return "Unknown"
 
     year = invoice_date[:4]
-    return year if year.isdigit() else "Unknown"
+    return year if year.isascii() and year.isdigit() else "Unknown"
 
 
+@lru_cache(maxsize=4096)
 def sheet_name_for_date(invoice_date: str | None) -> str:
     """Build the target sheet name for a given invoice date."""
     year = extract_year(invoice_date)
@@ -0,0 +1,23 @@
+"""Shared pytest fixtures."""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def service():
+    """Provide one default OpenRouterService shared by the whole test session."""
+    from invoice_scanner import OpenRouterService
+
+    return OpenRouterService("test-key")
+
+
+@pytest.fixture
+def mock_send_request(monkeypatch):
+    """Replace OpenRouterService._send_request with a MagicMock."""
+    mock = MagicMock()
+    monkeypatch.setattr(
+        "invoice_scanner.openrouter.OpenRouterService._send_request", mock
+    )
+    return mock
@@ -0,0 +1,72 @@
+"""Tests for the extraction cache."""
+
+import json
+from datetime import datetime, timedelta
+
+
+class TestExtractionCache:
+    """Test cases for the ExtractionCache class."""
+
+    def test_put_then_get_round_trips(self, tmp_path):
+        """Test that a stored value is returned for the same key."""
+        from invoice_scanner.cache import ExtractionCache
+
+        cache = ExtractionCache(tmp_path)
+        cache.put("key", {"invoice_number": "INV-001"})
+
+        assert cache.get("key") == {"invoice_number": "INV-001"}
+        assert cache.get("other") is None
+
+    def test_put_records_utc_expiry(self, tmp_path):
+        """Test that entries carry timezone-aware timestamps one TTL apart."""
+        from invoice_scanner.cache import ExtractionCache
+
+        cache = ExtractionCache(tmp_path)
+        cache.put("key", {"invoice_number": "INV-001"})
+
+        entry = json.loads((tmp_path / "key.json").read_text())
+        created_at = datetime.fromisoformat(entry["created_at"])
+        expires_at = datetime.fromisoformat(entry["expires_at"])
+        assert created_at.utcoffset() == timedelta(0)
+        assert expires_at - created_at == ExtractionCache.TTL
+        assert cache.get("key") == {"invoice_number": "INV-001"}
+
+    def test_expired_entries_are_ignored(self, tmp_path):
+        """Test that entries past their TTL are treated as misses."""
+        from invoice_scanner.cache import ExtractionCache
+
+        cache = ExtractionCache(tmp_path, ttl=timedelta(seconds=-1))
+        cache.put("key", {"invoice_number": "INV-001"})
+
+        assert cache.get("key") is None
+
+    def test_corrupt_entries_are_ignored(self, tmp_path):
+        """Test that an unreadable cache file is treated as a miss."""
+        from invoice_scanner.cache import ExtractionCache
+
+        (tmp_path / "key.json").write_text("not json")
+
+        assert ExtractionCache(tmp_path).get("key") is None
+
+    def test_non_object_and_naive_entries_are_ignored(self, tmp_path):
+        """Test that hand-edited entries with bad shapes are treated as misses."""
+        from invoice_scanner.cache import ExtractionCache
+
+        cache = ExtractionCache(tmp_path)
+        cache.put("list", ["INV-001"])
+        (tmp_path / "naive.json").write_text(
+            json.dumps({"expires_at": "2999-01-01T00:00:00", "value": {}})
+        )
+
+        assert cache.get("list") is None
+        assert cache.get("naive") is None
+
+    def test_make_key_depends_on_digest_and_parts(self):
+        """Test that the key changes with the PDF digest and the model inputs."""
+        from invoice_scanner.cache import ExtractionCache
+
+        key = ExtractionCache.make_key("digest", "openrouter", "model", "v1")
+
+        assert key == ExtractionCache.make_key("digest", "openrouter", "model", "v1")
+        assert key != ExtractionCache.make_key("digest2", "openrouter", "model", "v1")
+        assert key != ExtractionCache.make_key("digest", "openrouter", "model", "v2")
@@ -70,6 +70,15 @@ class TestConfig:
             config = Config(state)
             assert config.google_credentials_path == "credentials.json"
 
+    def test_config_extraction_workers(self):
+        """Test that extraction concurrency defaults to 5 and reads the env var."""
+        state = State()
+        with patch.dict(os.environ, {"OPENROUTER_API_KEY": "test-key"}, clear=True):
+            assert Config(state).extraction_workers == 5
+        env_vars = {"OPENROUTER_API_KEY": "test-key", "EXTRACTION_WORKERS": "16"}
+        with patch.dict(os.environ, env_vars, clear=True):
+            assert Config(state).extraction_workers == 16
+
 
 class TestState:
     """Test cases for the State class."""
@@ -198,3 +207,27 @@ class TestInvoiceData:
             extraction_date="2024-03-15T10:00:00",
         )
         assert invoice.language == "unknown"
+
+    def test_invoice_data_normalizes_dates(self):
+        """Test that supported date layouts are normalized to YYYY-MM-DD."""
+        from invoice_scanner import InvoiceExtract
+
+        fields = {
+            "invoice_number": "INV-001",
+            "company": "Company",
+            "product": "Product",
+            "total_value": "100",
+            "currency": "EUR",
+        }
+        cases = {
+            "15.03.2024": "2024-03-15",
+            "2024-03-15": "2024-03-15",
+            "15.03.2024 10:00": "2024-03-15",
+            "March 15, 2024": "2024-03-15",
+        }
+        for raw, expected in cases.items():
+            invoice = InvoiceExtract(invoice_date=raw, **fields)
+            assert invoice.invoice_date == expected
+
+        with pytest.raises(ValueError, match="YYYY-MM-DD"):
+            InvoiceExtract(invoice_date="15/03/2024", **fields)
@@ -0,0 +1,22 @@
+"""Tests for Google API client helpers."""
+
+
+class TestOrjsonModel:
+    """Test cases for the OrjsonModel request/response codec."""
+
+    def test_serialize_returns_utf8_bytes(self):
+        """Test that request bodies are UTF-8 encoded JSON bytes."""
+        from invoice_scanner.google_api import OrjsonModel
+
+        body = OrjsonModel().serialize({"values": [["Müller GmbH", "€"]]})
+
+        assert body == '{"values":[["Müller GmbH","€"]]}'.encode()
+
+    def test_deserialize_matches_json_model(self):
+        """Test that responses decode like the stock JsonModel."""
+        from invoice_scanner.google_api import OrjsonModel
+
+        model = OrjsonModel()
+
+        assert model.deserialize(b'{"replies": []}') == {"replies": []}
+        assert model.deserialize(b"not json") == "not json"
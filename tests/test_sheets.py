@@ -0,0 +1,225 @@
+"""Tests for the Google Sheets service."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+def _invoice(file_id: str, invoice_date: str):
+    from invoice_scanner import InvoiceExtract
+
+    return InvoiceExtract(
+        file_id=file_id,
+        file_name=f"{file_id}.pdf",
+        invoice_number=f"INV-{file_id}",
+        invoice_date=invoice_date,
+        company="Company",
+        product="Product",
+        total_value="100.00",
+        currency="EUR",
+        language="en",
+    )
+
+
+class TestGoogleSheetsService:
+    """Test cases for the GoogleSheetsService class."""
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_append_invoices_batch_uses_one_request(self, mock_build):
+        """Test that new sheets, headers and rows all go in one batch update."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        spreadsheets.get.return_value.execute.return_value = {
+            "sheets": [{"properties": {"title": "Invoices 2024", "sheetId": 7}}]
+        }
+        spreadsheets.batchUpdate.return_value.execute.return_value = {}
+
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+        appended = service.append_invoices_batch(
+            [
+                _invoice("a", "2024-03-15"),
+                _invoice("b", "2025-01-02"),
+                _invoice("c", "2024-07-01"),
+            ]
+        )
+
+        assert appended == {"a", "b", "c"}
+        spreadsheets.batchUpdate.assert_called_once()
+        batch = spreadsheets.batchUpdate.call_args.kwargs["body"]["requests"]
+        assert [next(iter(request)) for request in batch] == [
+            "updateCells",
+            "appendCells",
+            "addSheet",
+            "updateCells",
+            "appendCells",
+        ]
+        new_sheet = batch[2]["addSheet"]["properties"]
+        assert new_sheet["title"] == "Invoices 2025"
+        assert new_sheet["sheetId"] != 7
+        assert batch[3]["updateCells"]["start"]["sheetId"] == new_sheet["sheetId"]
+        assert batch[1]["appendCells"]["sheetId"] == 7
+        assert batch[4]["appendCells"]["sheetId"] == new_sheet["sheetId"]
+        assert len(batch[1]["appendCells"]["rows"]) == 2
+        first_cell = batch[1]["appendCells"]["rows"][0]["values"][0]
+        assert first_cell == {"userEnteredValue": {"stringValue": "a"}}
+        spreadsheets.values.return_value.append.assert_not_called()
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_flush_caches_sheet_ids_from_add_sheet_replies(self, mock_build):
+        """Test that new sheets are cached under the title Sheets reports back."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        spreadsheets.get.return_value.execute.return_value = {
+            "sheets": [{"properties": {"title": "Invoices 2024", "sheetId": 7}}]
+        }
+        spreadsheets.batchUpdate.return_value.execute.return_value = {
+            "replies": [
+                {
+                    "addSheet": {
+                        "properties": {"title": "Invoices 2025 (1)", "sheetId": 42}
+                    }
+                },
+                {},
+                {},
+            ]
+        }
+
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+        service.append_invoices_batch([_invoice("a", "2025-01-02")])
+
+        assert service._sheet_ids == {"Invoices 2024": 7, "Invoices 2025 (1)": 42}
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_flush_without_pending_rows_is_a_no_op(self, mock_build):
+        """Test that flushing an empty queue makes no API calls."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+
+        assert service.flush() == set()
+        spreadsheets.batchUpdate.assert_not_called()
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_get_processed_file_ids_reads_all_year_sheets_once(self, mock_build):
+        """Test that processed IDs come from one batchGet and are cached."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        spreadsheets.get.return_value.execute.return_value = {
+            "sheets": [
+                {"properties": {"title": "Invoices 2024", "sheetId": 1}},
+                {"properties": {"title": "Invoices Unknown", "sheetId": 2}},
+                {"properties": {"title": "Notes", "sheetId": 3}},
+            ]
+        }
+        batch_get = spreadsheets.values.return_value.batchGet
+        batch_get.return_value.execute.return_value = {
+            "valueRanges": [{"values": [["a"], ["b"]]}, {"values": [[], ["c"]]}]
+        }
+
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+
+        assert service.get_processed_file_ids() == {"a", "b", "c"}
+        assert service.get_processed_file_ids() == {"a", "b", "c"}
+        batch_get.assert_called_once()
+        assert batch_get.call_args.kwargs["ranges"] == [
+            "Invoices 2024!A2:A",
+            "Invoices Unknown!A2:A",
+        ]
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_invalidate_titles_reloads_metadata(self, mock_build):
+        """Test that sheet metadata is fetched once until invalidated."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        spreadsheets.get.return_value.execute.return_value = {"sheets": []}
+
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+        service.get_processed_file_ids()
+        assert spreadsheets.get.call_count == 1
+
+        service.invalidate_titles()
+        service._processed_ids = None
+        service.get_processed_file_ids()
+        assert spreadsheets.get.call_count == 2
+
+    @patch("invoice_scanner.sheets.time.sleep")
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_execute_with_retry_honors_retry_after(self, mock_build, mock_sleep):
+        """Test that rate-limit retries wait for the server's Retry-After."""
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        rate_limited = HttpError(
+            httplib2.Response({"status": 429, "retry-after": "7"}), b""
+        )
+        request = MagicMock()
+        request.execute.side_effect = [rate_limited, {"ok": True}]
+
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+
+        assert service._execute_with_retry(request, "test") == {"ok": True}
+        mock_sleep.assert_called_once_with(7.0)
+
+    @patch("invoice_scanner.sheets.time.sleep")
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_execute_with_retry_jitters_within_cap(self, mock_build, mock_sleep):
+        """Test that transient errors back off with bounded jitter, then give up."""
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        request = MagicMock()
+        request.execute.side_effect = HttpError(httplib2.Response({"status": 503}), b"")
+
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+
+        with pytest.raises(HttpError):
+            service._execute_with_retry(request, "test")
+        assert request.execute.call_count == GoogleSheetsService.MAX_ATTEMPTS
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        assert all(
+            GoogleSheetsService.BACKOFF_BASE <= delay <= GoogleSheetsService.BACKOFF_CAP
+            for delay in delays
+        )
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_append_invoices_batch_skips_known_ids(self, mock_build):
+        """Test that already recorded file IDs are not written again."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        service = GoogleSheetsService(MagicMock(), "spreadsheet-id")
+        appended = service.append_invoices_batch(
+            [_invoice("a", "2024-03-15")], known_ids={"a"}
+        )
+
+        assert appended == set()
+        spreadsheets.batchUpdate.assert_not_called()
+
+    @patch("invoice_scanner.sheets.build_sheets_service")
+    def test_headers_installed_skips_header_rewrite(self, mock_build):
+        """Test that persisted header state skips the header write for known sheets."""
+        from invoice_scanner.sheets import GoogleSheetsService
+
+        spreadsheets = mock_build.return_value.spreadsheets.return_value
+        spreadsheets.get.return_value.execute.return_value = {
+            "sheets": [{"properties": {"title": "Invoices 2024", "sheetId": 7}}]
+        }
+        spreadsheets.batchUpdate.return_value.execute.return_value = {}
+
+        service = GoogleSheetsService(
+            MagicMock(), "spreadsheet-id", headers_installed=["Invoices 2024"]
+        )
+        service.append_invoices_batch([_invoice("a", "2024-03-15")])
+
+        body = spreadsheets.batchUpdate.call_args.kwargs["body"]
+        assert [next(iter(request)) for request in body["requests"]] == ["appendCells"]
+        assert service.headers_installed == {"Invoices 2024"}
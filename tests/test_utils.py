@@ -1,65 +1,80 @@
 """Tests for utility functions and helpers."""
 
+import hashlib
+import json
+
+import pytest
+
+from invoice_scanner import InvoiceExtract
+from invoice_scanner.utils import (
+    extract_year,
+    pdf_digest,
+    sheet_name_for_date,
+    strip_code_fences,
+)
+
 
 class TestYearExtraction:
     """Test cases for year extraction from invoice dates."""
 
-    def test_extract_year_from_date(self):
-        """Test extracting year from various date formats."""
-        from invoice_scanner.utils import extract_year
-
-        test_cases = [
+    @pytest.mark.parametrize(
+        ("date_str", "expected_year"),
+        [
             ("2024-03-15", "2024"),
             ("2024-12-31", "2024"),
             ("2025-01-01", "2025"),
             ("2023-06-20", "2023"),
-        ]
-
-        for date_str, expected_year in test_cases:
-            year = extract_year(date_str)
-            assert year == expected_year, f"Failed for date: {date_str}"
-
-    def test_extract_year_invalid_dates(self):
-        """Test handling of invalid dates."""
-        from invoice_scanner.utils import extract_year
+        ],
+    )
+    def test_extract_year_from_date(self, date_str, expected_year):
+        """Test extracting year from various date formats."""
+        assert extract_year(date_str) == expected_year
 
-        invalid_dates = [
+    @pytest.mark.parametrize(
+        "date_str",
+        [
             "",
             "N/A",
             "invalid",
             "15-03-2024",  # Wrong format
+            "٢٠٢٤-03-15",  # Non-ASCII digits
             None,
-        ]
-
-        for date_str in invalid_dates:
-            assert extract_year(date_str) == "Unknown"
+        ],
+    )
+    def test_extract_year_invalid_dates(self, date_str):
+        """Test handling of invalid dates."""
+        assert extract_year(date_str) == "Unknown"
 
 
 class TestSheetNameGeneration:
     """Test cases for sheet name generation based on year."""
 
-    def test_sheet_name_with_valid_year(self):
-        """Test generating sheet name from valid invoice dates."""
-        from invoice_scanner.utils import sheet_name_for_date
-
-        test_cases = [
+    @pytest.mark.parametrize(
+        ("date_str", "expected_sheet"),
+        [
             ("2024-03-15", "Invoices 2024"),
             ("2025-01-01", "Invoices 2025"),
             ("2023-12-31", "Invoices 2023"),
-        ]
-
-        for date_str, expected_sheet in test_cases:
-            sheet_name = sheet_name_for_date(date_str)
-            assert sheet_name == expected_sheet
+        ],
+    )
+    def test_sheet_name_with_valid_year(self, date_str, expected_sheet):
+        """Test generating sheet name from valid invoice dates."""
+        assert sheet_name_for_date(date_str) == expected_sheet
 
-    def test_sheet_name_with_invalid_date(self):
+    @pytest.mark.parametrize("date_str", ["", "N/A", None, "invalid"])
+    def test_sheet_name_with_invalid_date(self, date_str):
         """Test generating sheet name from invalid dates."""
-        from invoice_scanner.utils import sheet_name_for_date
+        assert sheet_name_for_date(date_str) == "Invoices Unknown"
 
-        invalid_dates = ["", "N/A", None, "invalid"]
 
-        for date_str in invalid_dates:
-            assert sheet_name_for_date(date_str) == "Invoices Unknown"
+class TestPdfDigest:
+    """Test cases for PDF content digests."""
+
+    def test_pdf_digest_is_length_prefixed_sha256(self):
+        """Test that the digest hashes the 8-byte length followed by the bytes."""
+        expected = hashlib.sha256((3).to_bytes(8, "big") + b"pdf").hexdigest()
+        assert pdf_digest(b"pdf") == expected
+        assert pdf_digest(b"") != hashlib.sha256(b"").hexdigest()
 
 
 class TestJSONParsing:
@@ -67,10 +82,6 @@ class TestJSONParsing:
 
     def test_extract_json_from_code_blocks(self):
         """Test extracting JSON from markdown code blocks."""
-        import json
-
-        from invoice_scanner.utils import strip_code_fences
-
         content = """```json
         {
             "invoice_number": "INV-001",
@@ -84,10 +95,6 @@ class TestJSONParsing:
 
     def test_extract_json_from_generic_code_blocks(self):
         """Test extracting JSON from generic markdown code blocks."""
-        import json
-
-        from invoice_scanner.utils import strip_code_fences
-
         content = """```
         {
             "invoice_number": "INV-002",
@@ -100,10 +107,6 @@ class TestJSONParsing:
 
     def test_extract_json_plain_text(self):
         """Test extracting JSON from plain text."""
-        import json
-
-        from invoice_scanner.utils import strip_code_fences
-
         content = """{
             "invoice_number": "INV-003",
             "company": "Plain Corp"
@@ -112,32 +115,41 @@ class TestJSONParsing:
         data = json.loads(strip_code_fences(content))
         assert data["invoice_number"] == "INV-003"
 
+    def test_extract_non_object_json_from_code_blocks(self):
+        """Test that fences around JSON without braces are stripped too."""
+        assert strip_code_fences('Here you go:\n```json\n["a", "b"]\n```') == (
+            '["a", "b"]'
+        )
+        assert strip_code_fences("```json\n[1, 2]") == "[1, 2]"
+        assert strip_code_fences("  N/A  ") == "N/A"
+
 
 class TestGermanTaxFields:
     """Test cases for German tax-related invoice fields."""
 
-    def test_german_date_formats(self):
-        """Test handling of German date formats."""
-        # German dates might be in DD.MM.YYYY format
-        german_dates = [
-            "15.03.2024",
-            "31.12.2024",
-            "01.01.2025",
-        ]
-
-        for date_str in german_dates:
-            # Should be normalized to ISO format or handled appropriately
-            if "." in date_str:
-                parts = date_str.split(".")
-                if len(parts) == 3:
-                    # Convert DD.MM.YYYY to YYYY-MM-DD
-                    iso_date = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                    assert len(iso_date) == 10
+    @pytest.mark.parametrize(
+        ("german_date", "iso_date"),
+        [
+            ("15.03.2024", "2024-03-15"),
+            ("31.12.2024", "2024-12-31"),
+            ("01.01.2025", "2025-01-01"),
+        ],
+    )
+    def test_german_date_formats(self, german_date, iso_date):
+        """Test that German DD.MM.YYYY dates are stored as YYYY-MM-DD."""
+        invoice = InvoiceExtract(
+            invoice_number="INV-001",
+            invoice_date=german_date,
+            company="Vendor GmbH",
+            product="Consulting Services",
+            total_value="119.00",
+            currency="EUR",
+        )
+
+        assert invoice.invoice_date == iso_date
 
     def test_required_fields_for_german_tax(self):
         """Test that all required fields for German tax filing are present."""
-        from invoice_scanner import InvoiceExtract
-
         invoice = InvoiceExtract(
             file_id="file-123",
             file_name="invoice.pdf",